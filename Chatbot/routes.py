@@ -1,5 +1,5 @@
-from flask import Flask, request, Blueprint
-from Chatbot.services.gemini_prompt import fitness_score, free_chat_either
+from flask import Flask, request, Blueprint, Response
+from Chatbot.services.gemini_prompt import fitness_score, fitness_scores_batch, fitness_scores_parallel, free_chat_either, free_chat_either_stream
 from Chatbot.utils import get_user_info, get_history_and_input
 
 chatbot = Blueprint("chatbot", __name__)
@@ -22,11 +22,47 @@ def free_chat_with_place_route():
     response = free_chat_either(user_id, liked_place_ids, styles, place_id, messages)
     return response
 
+@chatbot.route("/free-chat/stream", methods=["POST"])
+def free_chat_stream_route():
+    data = request.get_json()
+    user_id, liked_place_ids, styles, place_id = get_user_info(data, with_place=False)
+    messages = get_history_and_input(data)
+
+    chunks = free_chat_either_stream(user_id, liked_place_ids, styles, place_id=place_id, messages=messages)
+    return Response(chunks, mimetype="text/plain")
+
+@chatbot.route("/free-chat-with-place/stream", methods=["POST"])
+def free_chat_with_place_stream_route():
+    data = request.get_json()
+    user_id, liked_place_ids, styles, place_id = get_user_info(data, with_place=True)
+    messages = get_history_and_input(data)
+
+    chunks = free_chat_either_stream(user_id, liked_place_ids, styles, place_id, messages)
+    return Response(chunks, mimetype="text/plain")
+
 @chatbot.route("/fitness-score", methods=["POST"])
 def fitness_score_route():
     data = request.get_json()
     user_id, liked_place_ids, styles, place_id = get_user_info(data, with_place=True)
     response = fitness_score(user_id, liked_place_ids, styles, place_id)
+    if response is None:
+        return {"error": f"Place not found: {place_id}"}, 404
+    return response
+
+@chatbot.route("/fitness-score-batch", methods=["POST"])
+def fitness_score_batch_route():
+    data = request.get_json()
+    user_id, liked_place_ids, styles, _ = get_user_info(data, with_place=False)
+    place_ids = data["place_ids"]
+    response = fitness_scores_batch(user_id, liked_place_ids, styles, place_ids)
+    return response
+
+@chatbot.route("/fitness-score-parallel", methods=["POST"])
+def fitness_score_parallel_route():
+    data = request.get_json()
+    user_id, liked_place_ids, styles, _ = get_user_info(data, with_place=False)
+    place_ids = data["place_ids"]
+    response = fitness_scores_parallel(user_id, liked_place_ids, styles, place_ids)
     return response
 
 ## Future Implementation ##
@@ -1,5 +1,12 @@
 from pydantic import BaseModel, Field
+from typing import List
 
 class FitnessScore(BaseModel):
     score: int = Field(description="Score from 0 to 100")
     explanation: str = Field(description="Short explanation why this place fits the user")
+
+class PlaceFitnessScore(FitnessScore):
+    id: str = Field(description="ID of the scored place, copied exactly from the place list")
+
+class FitnessScoreBatch(BaseModel):
+    scores: List[PlaceFitnessScore]
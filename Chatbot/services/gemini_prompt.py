@@ -1,105 +1,326 @@
 from graph_rag_recommender.model.loadmodel import load_gemini_model
 from langchain_core.messages import HumanMessage
-from graph_rag_recommender.graph.create_graph import connect_driver, update_user_node
+from graph_rag_recommender.graph.create_graph import get_driver, update_user_node, flatten_liked_place_ids, PLACE_CATEGORIES
+from langchain_core.exceptions import OutputParserException
 from langchain_core.output_parsers import JsonOutputParser
 from langchain_core.prompts import PromptTemplate
-from Chatbot.schemas import FitnessScore
+from Chatbot.schemas import FitnessScore, FitnessScoreBatch
+from Chatbot.services.query_cache import QueryCache
+from Chatbot.services.rate_limiter import RateLimiter
+from concurrent.futures import ThreadPoolExecutor
+from google.ai.generativelanguage_v1beta.types import Schema, Type
+from neo4j import Result, RoutingControl
+import functools
 import json
+import re
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+NEO4J_DATABASE = "neo4j"
+
+# Shared pool for overlapping independent Neo4j reads and LLM calls
+_EXECUTOR = ThreadPoolExecutor(max_workers=8)
+
+# "user_id:place_id" -> (user_profile, relationship_summary), each user's last synced profile,
+# and "__place__:place_id" -> place description (places only change on re-import, so they live longer)
+_GRAPH_CACHE = QueryCache(default_ttl=60, max_size=1024)
+PLACE_CACHE_TTL = 600
+
+# Process-wide cap on concurrent-path LLM requests to stay under the Gemini RPM quota
+LLM_REQUESTS_PER_MINUTE = 60
+_LLM_RATE_LIMITER = RateLimiter(LLM_REQUESTS_PER_MINUTE, 60)
+
+@functools.lru_cache(maxsize=1)
+def _get_llm():
+    # The chat client is a thread-safe HTTP wrapper, so one instance serves every request
+    return load_gemini_model()
+
+# JSON mode for fitness scoring, so the prompt needs no format instructions. ChatGoogleGenerativeAI 2.1.4
+# has no response_mime_type/response_schema fields (they would land in the unused model_kwargs),
+# so this is passed as generation_config on each call.
+_PROTO_TYPES = {int: Type.INTEGER, float: Type.NUMBER, str: Type.STRING, bool: Type.BOOLEAN}
+
+def _response_schema(model):
+    # Built from the pydantic fields (flat models only) so the proto schema cannot drift from them
+    return Schema(
+        type_=Type.OBJECT,
+        properties={
+            name: Schema(type_=_PROTO_TYPES[field.annotation], description=field.description)
+            for name, field in model.model_fields.items()
+        },
+        required=[name for name, field in model.model_fields.items() if field.is_required()],
+    )
+
+_FITNESS_GENERATION_CONFIG = {
+    "response_mime_type": "application/json",
+    "response_schema": _response_schema(FitnessScore),
+}
+
+# Styles and liked categories; shared prefix of the user queries below
+_USER_PROFILE_SUBQUERIES = """
+    MATCH (u:User {id: $user_id})
+    CALL {
+        WITH u
+        OPTIONAL MATCH (u)-[:HAS_STYLE]->(s:Style)
+        RETURN collect(DISTINCT s.name) AS styles
+    }
+    CALL {
+        WITH u
+        OPTIONAL MATCH (u)-[:LIKED]->(p:Place)
+        RETURN collect(DISTINCT p.category) AS liked_categories
+    }
+"""
+
+# General chat without a selected place has no relationship to look up
+_USER_PROFILE_QUERY = _USER_PROFILE_SUBQUERIES + """
+    RETURN styles, liked_categories
+"""
+
+# Styles, liked categories and user-place relationship in one round-trip
+_USER_CONTEXT_QUERY = _USER_PROFILE_SUBQUERIES + """
+    CALL {
+        WITH u
+        OPTIONAL MATCH (u)-[:LIKED]->(p1:Place)-[:SIMILAR_TO]-(p2:Place {id: $place_id})
+        OPTIONAL MATCH (u)-[r:LIKED]->(p2:Place {id: $place_id})
+        RETURN count(r) > 0 AS directly_liked, count(p1) > 0 AS similar_liked, collect(DISTINCT p1.name) AS similar_places
+    }
+    RETURN styles, liked_categories, directly_liked, similar_liked, similar_places
+"""
+
+# Place details depend only on place_id, so they can be fetched before the user node is synced
+_PLACE_QUERY = """
+    MATCH (p:Place {id: $place_id})
+    RETURN p.name AS name, p.category AS category, p.description AS description
+"""
+
+# Details and user relationship for many places at once, used by fitness_scores_batch
+_PLACES_FOR_USER_QUERY = """
+    MATCH (p:Place)
+    WHERE p.id IN $place_ids
+    OPTIONAL MATCH (:User {id: $user_id})-[r:LIKED]->(p)
+    OPTIONAL MATCH (:User {id: $user_id})-[:LIKED]->(p1:Place)-[:SIMILAR_TO]-(p)
+    RETURN p.id AS id, p.name AS name, p.category AS category, p.description AS description,
+           count(r) > 0 AS directly_liked, count(p1) > 0 AS similar_liked, collect(DISTINCT p1.name) AS similar_places
+"""
+
+def _flatten_categories(raw_categories):
+    # Place.category is stored as a list (see generate_category), but tolerate scalar values too
+    flattened = []
+    for category in raw_categories:
+        flattened.extend(category if isinstance(category, list) else [category])
+    return list(dict.fromkeys(flattened))
+
+def _summarize_relationship(directly_liked, similar_liked, similar_names):
+    if directly_liked:
+        return "The user has directly liked this place before."
+    if similar_liked:
+        return f"The user has liked similar places such as: {', '.join(similar_names)}."
+    return "The user has no direct or similar connections to this place."
+
+def sync_user_node(driver, user_id, liked_place_ids, styles):
+    update_user_node(driver, user_id=user_id, liked_place_ids=liked_place_ids, styles=styles)
+
+    # Cached graph context only goes stale when the user's profile actually changes
+    profile_key = QueryCache.make_key(user_id, "__profile__")
+    profile = (tuple(flatten_liked_place_ids(liked_place_ids)), tuple(styles or ()))
+    if _GRAPH_CACHE.get(profile_key) != profile:
+        _GRAPH_CACHE.invalidate_prefix(QueryCache.make_key(user_id, ""))
+        _GRAPH_CACHE.set(profile_key, profile)
+
+def _fetch_user(driver, user_id, place_id):
+    cache_key = QueryCache.make_key(user_id, place_id)
+    cached = _GRAPH_CACHE.get(cache_key)
+    if cached is not None:
+        return cached
+
+    result = driver.execute_query(
+        _USER_CONTEXT_QUERY if place_id else _USER_PROFILE_QUERY, user_id=user_id, place_id=place_id,
+        database_=NEO4J_DATABASE, routing_=RoutingControl.READ, result_transformer_=Result.single
+    )
+
+    styles = result["styles"]
+    liked_cats = _flatten_categories(result["liked_categories"])
+    user_profile = f"The user prefers styles such as {', '.join(styles)} and has liked places in the following categories: {', '.join(liked_cats)}."
+
+    if place_id:
+        relationship_summary = _summarize_relationship(
+            result["directly_liked"], result["similar_liked"], result["similar_places"]
+        )
+    else:
+        relationship_summary = "The user has not selected a specific place."
+
+    context = (user_profile, relationship_summary)
+    _GRAPH_CACHE.set(cache_key, context)
+    return context
+
+def _fetch_place(driver, place_id):
+    if not place_id:
+        return None
+
+    cache_key = QueryCache.make_key("__place__", place_id)
+    cached = _GRAPH_CACHE.get(cache_key)
+    if cached is not None:
+        return cached
+
+    result = driver.execute_query(
+        _PLACE_QUERY, place_id=place_id,
+        database_=NEO4J_DATABASE, routing_=RoutingControl.READ, result_transformer_=Result.single
+    )
+    if result is None:
+        return None
+
+    place_description = f"{result['name']} ({result['category']}): {result['description']}"
+    _GRAPH_CACHE.set(cache_key, place_description, ttl=PLACE_CACHE_TTL)
+    return place_description
 
 def find_place_and_user_in_graph(driver, user_id, place_id):
-    with driver.session() as session:
-        style_result = session.run("""
-            MATCH (u:User {id: $user_id})-[:HAS_STYLE]->(s:Style)
-            OPTIONAL MATCH (u)-[:LIKED]->(p:Place)
-            WITH collect(DISTINCT s.name) AS styles, collect(DISTINCT p.category) AS raw_categories
-            UNWIND raw_categories AS cat_list
-            WITH styles, 
-                CASE WHEN apoc.meta.cypher.type(cat_list) = "LIST" THEN cat_list ELSE [cat_list] END AS normalized
-            UNWIND normalized AS cat
-            RETURN styles, collect(DISTINCT cat) AS liked_categories
-        """, user_id=user_id).single()
-
-        styles = style_result["styles"]
-        liked_cats = style_result["liked_categories"]
-        user_profile = f"The user prefers styles such as {', '.join(styles)} and has liked places in the following categories: {', '.join(liked_cats)}."
-
-        rel_result = session.run("""
-            MATCH (u:User {id: $user_id})
-            OPTIONAL MATCH (u)-[:LIKED]->(p1:Place)-[:SIMILAR_TO]-(p2:Place {id: $place_id})
-            OPTIONAL MATCH (u)-[r:LIKED]->(p2:Place {id: $place_id})
-            RETURN count(r) > 0 AS directly_liked, count(p1) > 0 AS similar_liked, collect(DISTINCT p1.name) AS similar_places
-        """, user_id=user_id, place_id=place_id).single()
-
-        if rel_result["directly_liked"]:
-            relationship_summary = "The user has directly liked this place before."
-        elif rel_result["similar_liked"]:
-            similar_names = rel_result["similar_places"]
-            relationship_summary = f"The user has liked similar places such as: {', '.join(similar_names)}."
-        else:
-            relationship_summary = "The user has no direct or similar connections to this place."
-
-        if place_id: 
-            place_result = session.run("""
-                MATCH (p:Place {id: $place_id})
-                RETURN p.name AS name, p.category AS category, p.description AS description
-            """, place_id = place_id).single()
-            place_description = f"{place_result['name']} ({place_result['category']}): {place_result['description']}"
-        else: place_description = None
-        
-        return user_profile, relationship_summary, place_description
-        
+    user_profile, relationship_summary = _fetch_user(driver, user_id, place_id)
+    return user_profile, relationship_summary, _fetch_place(driver, place_id)
+
+def _dumps_indented(value):
+    # Neo4j temporal/spatial values are not JSON types, so fall back to str() for them
+    if orjson is not None:
+        return orjson.dumps(value, default=str, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(value, default=str, indent=2, ensure_ascii=False)
+
 def format_results_for_llm(records):
     if not records:
         return "No data was returned from the graph."
 
-    formatted = []
-    for i, record in enumerate(records):
-        lines = [f"[Record {i+1}]"]
-        for key, value in record.items():
-            if isinstance(value, dict):
-                # Flatten node properties
-                lines.append(f"{key}: {json.dumps(value, indent=2)}")
-            else:
-                lines.append(f"{key}: {str(value)}")
-        formatted.append("\n".join(lines))
+    # Each record is serialized in one C-level pass instead of per key/value in Python
+    return "\n\n".join(
+        f"[Record {i}]\n{_dumps_indented(record)}" for i, record in enumerate(records, start=1)
+    )
 
-    return "\n\n".join(formatted)
 
+# Read-only queries the LLM may pick from instead of writing Cypher itself. Fixed query text keeps
+# Neo4j's plan cache warm, and $user_id/$place_id are always bound server-side, never by the model.
+CYPHER_TEMPLATES = {
+    "user_liked_similar": {
+        "description": "Places similar to ones the user has liked, excluding places the user already liked",
+        "params": [],
+        "query": """
+            MATCH (u:User {id: $user_id})-[:LIKED]->(:Place)-[:SIMILAR_TO]-(p:Place)
+            WHERE NOT (u)-[:LIKED]->(p)
+            RETURN DISTINCT p.id AS id, p.name AS name, p.category AS category, p.description AS description
+            LIMIT $limit
+        """,
+    },
+    "user_liked_places": {
+        "description": "Places the user has liked",
+        "params": [],
+        "query": """
+            MATCH (:User {id: $user_id})-[:LIKED]->(p:Place)
+            RETURN p.id AS id, p.name AS name, p.category AS category, p.description AS description
+            LIMIT $limit
+        """,
+    },
+    "places_by_user_style": {
+        "description": "Places whose category matches one of the user's preferred styles",
+        "params": [],
+        "query": """
+            MATCH (:User {id: $user_id})-[:HAS_STYLE]->(s:Style)
+            MATCH (p:Place)
+            WHERE s.name IN p.category
+            RETURN DISTINCT p.id AS id, p.name AS name, p.category AS category, p.description AS description
+            LIMIT $limit
+        """,
+    },
+    "places_by_category": {
+        "description": f"Places in a given category, one of: {', '.join(PLACE_CATEGORIES)}",
+        "params": ["category"],
+        "query": """
+            MATCH (p:Place)
+            WHERE $category IN p.category
+            RETURN p.id AS id, p.name AS name, p.category AS category, p.description AS description
+            LIMIT $limit
+        """,
+    },
+    "similar_to_place": {
+        "description": "Places similar to the place the user is asking about (requires a selected place)",
+        "params": [],
+        "requires_place": True,
+        "query": """
+            MATCH (:Place {id: $place_id})-[:SIMILAR_TO]-(p:Place)
+            RETURN DISTINCT p.id AS id, p.name AS name, p.category AS category, p.description AS description
+            LIMIT $limit
+        """,
+    },
+    "place_details": {
+        "description": "Details of the place the user is asking about (requires a selected place)",
+        "params": [],
+        "requires_place": True,
+        "query": """
+            MATCH (p:Place {id: $place_id})
+            RETURN p.id AS id, p.name AS name, p.category AS category, p.description AS description,
+                   p.latitude AS latitude, p.longitude AS longitude
+        """,
+    },
+}
 
-def run_and_format_cypher(driver, cypher_query):
-    with driver.session() as session:
-        try:
-            result = session.run(cypher_query)
-            records = result.data()  # List[Dict[str, Any]]
-        except Exception as e:
-            return f"Failed to run query: {str(e)}"
+DEFAULT_QUERY_LIMIT = 10
+MAX_QUERY_LIMIT = 25
 
-    return format_results_for_llm(records)
+_CODE_FENCE_PATTERN = re.compile(r"^```(?:json)?\s*|\s*```$")
 
+def parse_cypher_choice(response):
+    # Returns (template_name, params), or None for NO_CYPHER and anything off the whitelist
+    text = _CODE_FENCE_PATTERN.sub("", response.strip())
+    if text == "NO_CYPHER":
+        return None
 
-def free_chat_either(user_id, liked_place_ids, styles, place_id, messages):
-    driver = connect_driver()
-    update_user_node(driver, user_id=user_id, liked_place_ids=liked_place_ids, styles=styles)
-    
-    chat_history = "\n".join(
-        [f"{'User' if isinstance(m, HumanMessage) else 'Assistant'}: {m.content}" for m in messages]
-    )
+    try:
+        choice = json.loads(text)
+    except ValueError:
+        return None
 
-    graph_schema_description = """
-    # Graph Schema Overview:
-    - (User)-[:HAS_STYLE]->(Style)
-    - (User)-[:LIKED]->(Place)
-    - (Place)-[:SIMILAR_TO]-(Place)
-    - (Place) has properties: id, name, category, description
-    - (User) has properties: id
-    """
+    if not isinstance(choice, dict) or choice.get("template") not in CYPHER_TEMPLATES:
+        return None
 
-    cypher_prompt = PromptTemplate(
-    template="""
-        You are a Cypher query generator for a Neo4j travel assistant system.
+    params = choice.get("params")
+    return choice["template"], params if isinstance(params, dict) else {}
+
+
+def run_and_format_cypher(driver, template_name, llm_params, user_id, place_id):
+    template = CYPHER_TEMPLATES[template_name]
+    if template.get("requires_place") and not place_id:
+        return "No place is selected, so there is no place data to look up."
 
-        Use the following graph structure:
-        {graph_schema}
+    params = {name: llm_params.get(name) for name in template["params"]}
+    if any(value is None for value in params.values()):
+        return f"Missing parameters for query {template_name}: {', '.join(template['params'])}"
+
+    try:
+        limit = int(llm_params.get("limit", DEFAULT_QUERY_LIMIT))
+    except (TypeError, ValueError):
+        limit = DEFAULT_QUERY_LIMIT
+    params.update(user_id=user_id, place_id=place_id, limit=min(max(limit, 1), MAX_QUERY_LIMIT))
+
+    try:
+        records = driver.execute_query(
+            template["query"], params,
+            database_=NEO4J_DATABASE, routing_=RoutingControl.READ, result_transformer_=Result.data
+        )  # List[Dict[str, Any]]
+    except Exception as e:
+        return f"Failed to run query: {str(e)}"
+
+    return format_results_for_llm(records)
+
+
+def _describe_cypher_templates():
+    lines = []
+    for name, template in CYPHER_TEMPLATES.items():
+        params = ", ".join(template["params"]) or "none"
+        lines.append(f"- {name}: {template['description']} (params: {params})")
+    return "\n        ".join(lines)
+
+# Prompts are parsed once at import; request handlers only call .format()
+CYPHER_PROMPT = PromptTemplate(
+    template="""
+        You are a graph query planner for a Neo4j travel assistant system.
 
         User info:
         - ID: {user_id}
@@ -111,34 +332,21 @@ def free_chat_either(user_id, liked_place_ids, styles, place_id, messages):
         {chat_history}
 
         If the user's message relates to recommending or evaluating places,
-        generate a Cypher query to fetch relevant user/place/style data.
+        choose the one query below that fetches the most relevant user/place/style data:
+        {templates}
+
+        Respond with only a JSON object such as {{"template": "places_by_category", "params": {{"category": "Nature"}}}}.
+        "params" holds only the params listed for the chosen query, plus an optional integer "limit".
+        The user ID and place ID are filled in automatically.
 
         If the question is not related to the graph, return exactly "NO_CYPHER".
         """,
-        input_variables=["graph_schema", "user_id", "styles", "liked_place_ids", "place_line", "chat_history"]
-    )
-    place_line = f"- The user is asking about place ID: {place_id}" if place_id else ""
-
-    formatted_prompt = cypher_prompt.format(
-        graph_schema=graph_schema_description.strip(),
-        user_id=user_id,
-        styles=styles,
-        liked_place_ids=liked_place_ids,
-        place_line=place_line,
-        chat_history=chat_history
-    )
-
-    llm = load_gemini_model()
-    cypher_response = llm([HumanMessage(content=formatted_prompt)]).content.strip()
-    user_profile, place_description, relationship_summary = find_place_and_user_in_graph(driver, user_id, place_id)
-
-    print(user_profile, "\n")
-    print(place_description, "\n")
-    print(relationship_summary, "\n")
+    input_variables=["user_id", "styles", "liked_place_ids", "place_line", "chat_history"],
+    partial_variables={"templates": _describe_cypher_templates()}
+)
 
-    if cypher_response == "NO_CYPHER":
-        general_prompt = PromptTemplate(
-            template="""
+GENERAL_PROMPT = PromptTemplate(
+    template="""
             You are a friendly travel assistant.
 
             Use the following graph data to generate a personalized response to the user's question.
@@ -157,22 +365,11 @@ def free_chat_either(user_id, liked_place_ids, styles, place_id, messages):
 
             Please respond in English, naturally and helpfully.
             """,
-            input_variables=["user_profile", "place_description", "relationship_summary", "chat_history"]
-        )
-
-        response_prompt = general_prompt.format(
-            user_profile=user_profile,
-            place_description=place_description,
-            relationship_summary=relationship_summary,
-            chat_history = chat_history
-        )
-        reply = llm([HumanMessage(content= response_prompt)]).content.strip()
-        return {"reply":reply}
-
-    result_text = run_and_format_cypher(driver, cypher_response)
+    input_variables=["user_profile", "place_description", "relationship_summary", "chat_history"]
+)
 
-    answer_prompt = PromptTemplate(
-        template="""
+ANSWER_PROMPT = PromptTemplate(
+    template="""
         You are a travel assistant.
 
         Use the following user information and graph query result to answer the user's question.
@@ -196,31 +393,11 @@ def free_chat_either(user_id, liked_place_ids, styles, place_id, messages):
 
         If there is no chat history just return greeting message
         """,
-        input_variables=["user_profile", "place_description", "relationship_summary","result_text", "chat_history"]
-    )
-
-    final_prompt = answer_prompt.format(
-        user_profile = user_profile,
-        place_description = place_description,
-        relationship_summary = relationship_summary,
-        result_text=result_text,
-        chat_history=chat_history
-    )
-    reply = llm([HumanMessage(content=final_prompt)]).content.strip()
-    return {"reply": reply}
-
-
-def fitness_score(user_id, liked_place_ids, styles, place_id):
-    driver = connect_driver()
-    update_user_node(driver, user_id=user_id, liked_place_ids=liked_place_ids, styles=styles)
-
-    llm = load_gemini_model()
-    parser = JsonOutputParser(pydantic_schema= FitnessScore)
-
-    user_profile, place_description, relationship_summary = find_place_and_user_in_graph(driver, user_id, place_id)
+    input_variables=["user_profile", "place_description", "relationship_summary", "result_text", "chat_history"]
+)
 
-    prompt = PromptTemplate(
-        template ="""
+FITNESS_PROMPT = PromptTemplate(
+    template="""
         You are a travel recommendation assistant. 
 
         A user has the following profile:
@@ -232,27 +409,272 @@ def fitness_score(user_id, liked_place_ids, styles, place_id):
         And here is the relationship between the user and the place:
         {relationship_summary}
 
-        Please evaluate how well this place matches the user's preferences.
+        Please evaluate how well this place matches the user's preferences
+        with a score from 0 to 100 and a short explanation.
+        """,
+    input_variables=["user_profile", "place_description", "relationship_summary"]
+)
 
-        Return your response in JSON format with the following fields:
+# Scoring quality drops off as more places share one prompt, so batches are capped
+FITNESS_BATCH_SIZE = 10
+
+_BATCH_PARSER = JsonOutputParser(pydantic_object=FitnessScoreBatch)
+
+FITNESS_BATCH_PROMPT = PromptTemplate(
+    template="""
+        You are a travel recommendation assistant. 
+
+        A user has the following profile:
+        {user_profile}
+
+        Here is a numbered list of places. Each row includes the place ID, the place itself,
+        and the relationship between the user and the place:
+        {place_rows}
+
+        For each place below, evaluate how well it matches the user's preferences.
+
+        Return a JSON object with a "scores" list containing one entry per place with the following fields:
+        - id: string (copy the place ID exactly as shown in the list)
         - score: integer (0~100)
         - explanation: string
 
         {format_instructions}
         """,
-        input_variables=["user_profile", "place_description", "relationship_summary"],
-        partial_variables={"format_instructions": parser.get_format_instructions()}
-    )
+    input_variables=["user_profile", "place_rows", "format_instructions"]
+).partial(format_instructions=_BATCH_PARSER.get_format_instructions())
+
+# Messages that are only a greeting get a canned reply without any LLM call
+_GREETING_PATTERN = re.compile(r"^\s*(hi|hello|hey|안녕(하세요)?)\s*[!.?~]*\s*$", re.IGNORECASE)
+GREETING_REPLY = "Hello! How can I help plan your Seoul trip?"
+
+def _is_trivial_chat(messages):
+    return bool(messages) and isinstance(messages[-1], HumanMessage) and bool(_GREETING_PATTERN.match(messages[-1].content))
+
+
+# Prompts only see the most recent turns, bounded by both count and characters
+MAX_HISTORY_TURNS = 8
+MAX_HISTORY_CHARS = 4000
+
+def _recent_messages(messages):
+    recent = messages[-MAX_HISTORY_TURNS:]
+    total_chars = sum(len(m.content) for m in recent)
+
+    # Drop the oldest turns until within budget, but always keep the latest message
+    start = 0
+    while total_chars > MAX_HISTORY_CHARS and start < len(recent) - 1:
+        total_chars -= len(recent[start].content)
+        start += 1
+    return recent[start:]
+
+# Chatbot.utils builds plain HumanMessage/AIMessage objects, so an exact-type lookup suffices
+_ROLE = {HumanMessage: "User"}
+
+def _role(message):
+    return _ROLE.get(type(message), "Assistant")
+
+def _render_chat_history(messages):
+    return "\n".join(f"{_role(m)}: {m.content}" for m in _recent_messages(messages))
+
+
+def _build_reply_prompt(user_id, liked_place_ids, styles, place_id, messages):
+    # Returns the prompt for the final reply, or None when a canned greeting is enough
+    driver = get_driver()
+
+    if _is_trivial_chat(messages):
+        sync_user_node(driver, user_id, liked_place_ids, styles)
+        return None
+
+    # The place lookup does not depend on the user node, so it starts before the sync write
+    place_future = _EXECUTOR.submit(_fetch_place, driver, place_id)
+    sync_user_node(driver, user_id, liked_place_ids, styles)
     
-    formatted_prompt = prompt.format(
+    # Rendered once and shared by the Cypher prompt and the reply prompt
+    chat_history = _render_chat_history(messages)
+
+    place_line = f"- The user is asking about place ID: {place_id}" if place_id else ""
+
+    formatted_prompt = CYPHER_PROMPT.format(
+        user_id=user_id,
+        styles=styles,
+        liked_place_ids=liked_place_ids,
+        place_line=place_line,
+        chat_history=chat_history
+    )
+
+    llm = _get_llm()
+
+    # The graph lookups do not depend on the generated Cypher, so run them all concurrently
+    user_future = _EXECUTOR.submit(_fetch_user, driver, user_id, place_id)
+    cypher_future = _EXECUTOR.submit(llm, [HumanMessage(content=formatted_prompt)])
+
+    user_profile, relationship_summary = user_future.result()
+    place_description = place_future.result()
+    cypher_choice = parse_cypher_choice(cypher_future.result().content)
+
+    print(user_profile, "\n")
+    print(place_description, "\n")
+    print(relationship_summary, "\n")
+
+    if cypher_choice is None:
+        return GENERAL_PROMPT.format(
+            user_profile=user_profile,
+            place_description=place_description,
+            relationship_summary=relationship_summary,
+            chat_history = chat_history
+        )
+
+    template_name, llm_params = cypher_choice
+    result_text = run_and_format_cypher(driver, template_name, llm_params, user_id, place_id)
+
+    return ANSWER_PROMPT.format(
+        user_profile = user_profile,
+        place_description = place_description,
+        relationship_summary = relationship_summary,
+        result_text=result_text,
+        chat_history=chat_history
+    )
+
+
+def free_chat_either(user_id, liked_place_ids, styles, place_id, messages):
+    reply_prompt = _build_reply_prompt(user_id, liked_place_ids, styles, place_id, messages)
+    if reply_prompt is None:
+        return {"reply": GREETING_REPLY}
+
+    reply = _get_llm()([HumanMessage(content=reply_prompt)]).content.strip()
+    return {"reply": reply}
+
+
+def free_chat_either_stream(user_id, liked_place_ids, styles, place_id, messages):
+    # Graph and Cypher work happens eagerly so failures surface before streaming starts
+    reply_prompt = _build_reply_prompt(user_id, liked_place_ids, styles, place_id, messages)
+    if reply_prompt is None:
+        return iter([GREETING_REPLY])
+    return _stream_reply(reply_prompt)
+
+
+def _stream_reply(prompt):
+    for chunk in _get_llm().stream([HumanMessage(content=prompt)]):
+        if chunk.content:
+            yield chunk.content
+
+
+def fitness_score(user_id, liked_place_ids, styles, place_id):
+    driver = get_driver()
+    place_future = _EXECUTOR.submit(_fetch_place, driver, place_id)
+    sync_user_node(driver, user_id, liked_place_ids, styles)
+
+    user_profile, relationship_summary = _fetch_user(driver, user_id, place_id)
+    place_description = place_future.result()
+
+    # Unknown places are never scored, matching fitness_scores_batch and fitness_scores_parallel
+    if place_description is None:
+        return None
+    return _score_place(user_profile, place_description, relationship_summary)
+
+
+def _score_place(user_profile, place_description, relationship_summary):
+    formatted_prompt = FITNESS_PROMPT.format(
         user_profile=user_profile,
         place_description=place_description,
         relationship_summary=relationship_summary
     )
 
-    response = llm([HumanMessage(content=formatted_prompt)])
-    parsed = parser.parse(response.content)
-    return parsed
+    response = _get_llm().invoke(
+        [HumanMessage(content=formatted_prompt)], generation_config=_FITNESS_GENERATION_CONFIG
+    )
+    # response_schema constrains decoding to FitnessScore, so the reply is bare JSON
+    return FitnessScore.model_validate_json(response.content).model_dump()
+
+
+def _place_row(record):
+    return {
+        "id": record["id"],
+        "description": f"{record['name']} ({record['category']}): {record['description']}",
+        "relationship_summary": _summarize_relationship(
+            record["directly_liked"], record["similar_liked"], record["similar_places"]
+        ),
+    }
+
+
+def _fetch_place_rows(driver, user_id, place_ids):
+    # Details and relationships for every place in one round-trip
+    records, _, _ = driver.execute_query(
+        _PLACES_FOR_USER_QUERY, user_id=user_id, place_ids=list(place_ids),
+        database_=NEO4J_DATABASE, routing_=RoutingControl.READ
+    )
+
+    # Keep the caller's order; ids that are not in the graph are skipped
+    by_id = {record["id"]: record for record in records}
+    return [_place_row(by_id[place_id]) for place_id in dict.fromkeys(place_ids) if place_id in by_id]
+
+
+def _score_place_rows(llm, user_profile, rows):
+    place_rows = "\n".join(
+        f"{i}. ID: {row['id']}\n"
+        f"   Place: {row['description']}\n"
+        f"   Relationship: {row['relationship_summary']}"
+        for i, row in enumerate(rows, start=1)
+    )
+    formatted_prompt = FITNESS_BATCH_PROMPT.format(user_profile=user_profile, place_rows=place_rows)
+
+    scores = {}
+    try:
+        with _LLM_RATE_LIMITER:
+            response = llm([HumanMessage(content=formatted_prompt)])
+        batch = FitnessScoreBatch.model_validate(_BATCH_PARSER.parse(response.content))
+        scores = {score.id: score.model_dump() for score in batch.scores}
+    except (OutputParserException, ValueError) as e:
+        print(f"Batch fitness scoring failed, falling back to single scoring: {e}")
+
+    # Score any place the batch response dropped or mangled one at a time
+    for row in rows:
+        if row["id"] not in scores:
+            try:
+                with _LLM_RATE_LIMITER:
+                    parsed = _score_place(user_profile, row["description"], row["relationship_summary"])
+            except (OutputParserException, ValueError) as e:
+                print(f"Fitness scoring failed for place {row['id']}, skipping it: {e}")
+                continue
+            scores[row["id"]] = {"id": row["id"], **parsed}
+
+    return [scores[row["id"]] for row in rows if row["id"] in scores]
+
+
+def fitness_scores_batch(user_id, liked_place_ids, styles, place_ids, max_concurrency=4):
+    driver = get_driver()
+    sync_user_node(driver, user_id, liked_place_ids, styles)
+
+    llm = _get_llm()
+    user_profile, _, _ = find_place_and_user_in_graph(driver, user_id, None)
+
+    rows = _fetch_place_rows(driver, user_id, place_ids)
+    chunks = [rows[i:i + FITNESS_BATCH_SIZE] for i in range(0, len(rows), FITNESS_BATCH_SIZE)]
+
+    # A dedicated pool, so long batch calls never tie up the shared _EXECUTOR used by chat requests
+    scores = []
+    with ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+        for chunk_scores in pool.map(lambda chunk: _score_place_rows(llm, user_profile, chunk), chunks):
+            scores.extend(chunk_scores)
+    return {"scores": scores}
+
+
+def fitness_scores_parallel(user_id, liked_place_ids, styles, place_ids, max_concurrency=8):
+    driver = get_driver()
+    sync_user_node(driver, user_id, liked_place_ids, styles)
+
+    user_profile, _, _ = find_place_and_user_in_graph(driver, user_id, None)
+    rows = _fetch_place_rows(driver, user_id, place_ids)
+
+    # Graph data is loaded up front; only the LLM calls are parallel
+    def score(row):
+        with _LLM_RATE_LIMITER:
+            parsed = _score_place(user_profile, row["description"], row["relationship_summary"])
+        return {"id": row["id"], **parsed}
+
+    # A dedicated pool, so callers waiting on the rate limiter never tie up the shared _EXECUTOR
+    with ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+        scores = list(pool.map(score, rows))
+    return {"scores": scores}
 
 
 # def when_to_visit(user_id, liked_place_ids, styles, place_id):
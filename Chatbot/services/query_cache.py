@@ -0,0 +1,52 @@
+import threading
+import time
+from collections import OrderedDict
+
+class QueryCache:
+    """In-process TTL + LRU cache for graph query results."""
+
+    def __init__(self, default_ttl=60, max_size=1024):
+        self.default_ttl = default_ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()  # key -> (value, expires_at)
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def make_key(*parts):
+        # Plain "a:b" keys (not hashed) so entries can be invalidated by prefix
+        return ":".join(str(part) for part in parts)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return default
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (self.default_ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def invalidate_prefix(self, prefix):
+        with self._lock:
+            for key in [k for k in self._entries if k.startswith(prefix)]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
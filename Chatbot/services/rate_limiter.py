@@ -0,0 +1,43 @@
+import threading
+import time
+
+class RateLimiter:
+    """Token bucket allowing `max_rate` acquisitions per `time_period` seconds.
+
+    Thread-safe, so one instance can cap LLM calls made from every worker
+    thread in the process.
+    """
+
+    def __init__(self, max_rate, time_period=60):
+        self.max_rate = max_rate
+        self.time_period = time_period
+        self._tokens = float(max_rate)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _try_acquire(self):
+        # Returns 0 when a token was taken, otherwise seconds until one is available
+        with self._lock:
+            now = time.monotonic()
+            refill = (now - self._updated_at) * self.max_rate / self.time_period
+            self._tokens = min(self.max_rate, self._tokens + refill)
+            self._updated_at = now
+
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0
+            return (1 - self._tokens) * self.time_period / self.max_rate
+
+    def acquire(self):
+        while True:
+            wait = self._try_acquire()
+            if not wait:
+                return
+            time.sleep(wait)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
@@ -10,18 +10,27 @@ from geopy.distance import geodesic
 from config.env_loader import get_neo4j_config
 from langchain_core.messages import HumanMessage
 import json
+import functools
+
+# Categories assigned to places by generate_category; also offered to the chatbot's query planner
+PLACE_CATEGORIES = ["Activites", "Nature", "Shopping", "SNS hot places", "Culture-Art-History", "Eating", "Tourist spot"]
 
 def load_data():
     csv_path = Path(__file__).resolve().parents[1] / "data" / "places_2.csv"
     return pd.read_csv(csv_path, dtype={"_id": str})
 
-def connect_driver(): 
+def connect_driver(**driver_options): 
     neo = get_neo4j_config()
     uri = neo["uri"]
     user = neo["username"]
     password = neo["password"]
 
-    return GraphDatabase.driver(uri, auth=(user, password))
+    return GraphDatabase.driver(uri, auth=(user, password), **driver_options)
+
+@functools.lru_cache(maxsize=1)
+def get_driver():
+    # Shared driver for request handlers; callers must not close it
+    return connect_driver(max_connection_pool_size=50, connection_acquisition_timeout=30)
 
 def flatten_liked_place_ids(liked_place_ids):
     flattened = []
@@ -41,7 +50,7 @@ def generate_category(description, llm):
     # 카테고리 수정 필요 -> 완료
     prompt = f"""
         Based on the following place description, classify it into only one of the following categories:
-        [Activites, Nature, Shopping, SNS hot places, Culture-Art-History, Eating, Tourist spot]
+        [{", ".join(PLACE_CATEGORIES)}]
 
         Description: "{description}"
         Just return the category names only, separated by commas. For example: "Nature, Shopping"
@@ -128,40 +137,44 @@ def connect_similar_places(driver, sim_threshold, max_distance_km):
                     MERGE (p1)-[:SIMILAR_TO]->(p2)
                 """, id1=id1, id2=id2)
 
+def _write_user_node(tx, user_id, liked_place_ids, styles):
+    tx.run("""
+        MERGE (u:User {id: $user_id})
+    """, user_id = user_id)
+
+    tx.run("""
+        MATCH (u: User {id: $user_id}) - [r: HAS_STYLE] -> ()
+        DELETE r
+    """, user_id = user_id)
+
+    if styles: 
+        tx.run("""
+            MATCH (u:User {id: $user_id})
+            UNWIND $styles AS style_name
+            MERGE (s:Style {name: style_name})
+            MERGE (u)-[:HAS_STYLE]->(s)
+        """, user_id=user_id, styles=styles)
+        
+    tx.run("""
+        MATCH (u:User {id: $user_id}) - [r:LIKED] -> ()
+        DELETE r
+    """, user_id=user_id)
+
+    if liked_place_ids:
+        tx.run("""
+            MATCH (u:User {id: $user_id})
+            UNWIND $liked_place_ids AS place_id
+            MATCH (p:Place {id: place_id})
+            MERGE (u)-[:LIKED]->(p)
+        """, user_id=user_id, liked_place_ids=liked_place_ids)
+
 def update_user_node(driver, user_id: str, liked_place_ids: list, styles: list):
 
     flattened_liked_place_ids = flatten_liked_place_ids(liked_place_ids)
-    with driver.session(database="neo4j") as session:
-
-        session.run("""
-            MERGE (u:User {id: $user_id})
-        """, user_id = user_id)
-
-        session.run("""
-            MATCH (u: User {id: $user_id}) - [r: HAS_STYLE] -> ()
-            DELETE r
-        """, user_id = user_id)
-
-        if styles: 
-            session.run("""
-                MATCH (u:User {id: $user_id})
-                UNWIND $styles AS style_name
-                MERGE (s:Style {name: style_name})
-                MERGE (u)-[:HAS_STYLE]->(s)
-            """, user_id=user_id, styles=styles)
-            
-        session.run("""
-            MATCH (u:User {id: $user_id}) - [r:LIKED] -> ()
-            DELETE r
-        """, user_id=user_id)
-
-        if flattened_liked_place_ids:
-            session.run("""
-                MATCH (u:User {id: $user_id})
-                UNWIND $liked_place_ids AS place_id
-                MATCH (p:Place {id: place_id})
-                MERGE (u)-[:LIKED]->(p)
-            """, user_id=user_id, liked_place_ids=flattened_liked_place_ids)
+    # One managed write transaction: a single commit, and readers never see the profile half-rebuilt.
+    # Sharing the execute_query bookmark manager makes later driver.execute_query reads see this write.
+    with driver.session(database="neo4j", bookmark_manager=driver.execute_query_bookmark_manager) as session:
+        session.execute_write(_write_user_node, user_id, flattened_liked_place_ids, styles)
 
 if __name__=="__main__":
     driver = connect_driver()